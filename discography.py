@@ -19,23 +19,37 @@ Copyright and Usage Information
 This file is Copyright (c) 2023 Hamin Lee, Eugene Cho.
 """
 from __future__ import annotations
+import zlib
 import numpy as np
 
+# Number of characters from the start of a Song's lyrics that are kept (compressed) as its snippet
+SNIPPET_LENGTH = 200
+
+# Two Songs share an edge when the lyrical similarity of their embeddings is above this threshold
+SIMILARITY_THRESHOLD = 0.75
+
 
 class Song:
     """
     Song class for Versify Project
 
-    This class creates a song object that holds information about its title, lyrics, and embedding.
+    This class creates a song object that holds information about its title, database key, and embedding.
+
+    The full lyrics of the Song are not stored on the object (they would otherwise be duplicated inside
+    discographies.pkl for every cached artist). Instead, the Song keeps the rowid of its entry in the 'songs'
+    table of lyrics_ds.db, so that the lyrics can be loaded on demand, along with an optional zlib-compressed
+    snippet of the opening lyrics.
 
     Instance Attributes:
         - title: title of the Song
-        - lyrics: lyrics of the Song
+        - artist_name: name of the artist of the Song
+        - rowid: rowid of the Song in the 'songs' table of lyrics_ds.db
         - embedding: a list of floats generated by cohere that is used to compare two distinct Song objects
         - similar_songs: a dictionary that stores other songs that are similar to self (they share an edge)
+        - compressed_snippet: the zlib-compressed opening lyrics of the Song, or None if no snippet was given
 
     Representation Invariants:
-        - title and lyrics are matching of the actual song
+        - title and rowid are matching of the actual song (the title is checked whenever lyrics are loaded by rowid)
         - embedding is created from cohere API call
         - all songs in similar_songs have the same artist
         - all(self in song.similar_songs for song in self.similar_songs.values())
@@ -43,26 +57,42 @@ class Song:
         - all(title == song.title for title, song in self.similar_songs.items())
     """
     title: str
-    lyrics: str
+    artist_name: str
+    rowid: int
     embedding: list[float]
     similar_songs: dict[str, Song]
+    compressed_snippet: bytes | None
 
-    def __init__(self, title: str, lyrics: str, embedding: list[float]) -> None:
+    def __init__(self, title: str, artist_name: str, rowid: int, embedding: list[float], snippet: str = '') -> None:
         """
         Song initializer
 
-        It is initialized with given title, lyrics, embedding and no connection to any other Song
+        It is initialized with given title, artist_name, rowid, embedding and no connection to any other Song.
+        If snippet is given, it is stored compressed in self.compressed_snippet.
 
         Preconditions:
             - title != ''
-            - lyrics != ''
             - embedding != []
         """
         self.title = title
-        self.lyrics = lyrics
+        self.artist_name = artist_name
+        self.rowid = rowid
         self.embedding = embedding
         self.similar_songs = {}
 
+        if snippet != '':
+            self.compressed_snippet = zlib.compress(snippet.encode('utf-8'))
+        else:
+            self.compressed_snippet = None
+
+    def snippet(self) -> str:
+        """
+        Returns the decompressed opening lyrics of this Song, or an empty string if no snippet was stored
+        """
+        if self.compressed_snippet is None:
+            return ''
+        return zlib.decompress(self.compressed_snippet).decode('utf-8')
+
     def lyrical_similarity(self, other: Song) -> float:
         """
         Returns a float between 0 and 1 based on how lyrically similar self is to other based on comparing
@@ -106,16 +136,19 @@ class Discography:
         self.artist_name = artist_name
         self.songs = {}
 
-    def add_song(self, title: str, lyrics: str, embedding: list[float]) -> None:
+    def add_song(self, title: str, rowid: int, lyrics: str, embedding: list[float]) -> None:
         """
         Creates a Song object for the artist with given arguments, and adds it to self.songs
 
+        Only the first SNIPPET_LENGTH characters of lyrics are kept on the Song (as its snippet); the full lyrics
+        are loaded from lyrics_ds.db using rowid when they are needed.
+
         Preconditions:
             - title != ''
             - lyrics != ''
             - embedding != []
         """
-        song = Song(title, lyrics, embedding)
+        song = Song(title, self.artist_name, rowid, embedding, lyrics[:SNIPPET_LENGTH])
         self.songs[title] = song
 
     def add_similarity_edge(self, song1: Song, song2: Song) -> None:
@@ -143,13 +176,28 @@ class Discography:
             - len(self.songs) > 0
         """
         if len(self.songs) > 5:
-            threshold = 0.75
-
             for song1 in self.songs:
                 for song2 in self.songs:
-                    if song1 != song2 and self.songs[song1].lyrical_similarity(self.songs[song2]) > threshold:
+                    if song1 != song2 and \
+                            self.songs[song1].lyrical_similarity(self.songs[song2]) > SIMILARITY_THRESHOLD:
                         self.add_similarity_edge(self.songs[song1], self.songs[song2])
 
+    def match_song_similarities(self, song: Song) -> None:
+        """
+        Creates an edge between song and every other "lyrically similar" song in self.songs
+
+        This lets the graph grow one Song at a time as embeddings become available. Calling this for each
+        Song right after it is added results in the same edges as match_all_similarities() (the edges are
+        simply unused by top_five_songs() if this Discography ends up with 5 or fewer songs).
+
+        Preconditions:
+            - song.title in self.songs
+            - self.songs[song.title] is song
+        """
+        for other in self.songs.values():
+            if other is not song and song.lyrical_similarity(other) > SIMILARITY_THRESHOLD:
+                self.add_similarity_edge(song, other)
+
     def top_five_songs(self) -> list[Song]:
         """
         Return the top five songs in the Discography with the highest degrees
@@ -176,12 +224,68 @@ class Discography:
 
             return top_five
 
+    def embedding_matrix(self) -> np.ndarray:
+        """
+        Return the embeddings of the songs in this Discography as the rows of a matrix, in the order of self.songs
+
+        Preconditions:
+            - len(self.songs) > 0
+        """
+        return np.array([song.embedding for song in self.songs.values()])
+
+
+def top_blended_songs(discographies: list[Discography]) -> list[Song]:
+    """
+    Return the five most central songs of the graph combining all of the given discographies
+
+    Every pair of songs across all of the discographies is compared at once, using the embeddings already stored in
+    the discographies, and two songs are considered to share an edge when their lyrical similarity is above
+    SIMILARITY_THRESHOLD (just like in a single Discography). Songs are ranked by their degree in this combined graph.
+
+    To keep the blend balanced, the most central song of each artist is chosen first (from the artist with the
+    highest degree song to the lowest), and the remaining songs are then chosen by degree. The returned list is in
+    the order songs were chosen, so removing songs from its end keeps as many artists as possible.
+
+    Raises ValueError if the songs' embeddings do not all have the same length (which happens when the
+    discographies were generated with different cohere embedding models), since they cannot be compared.
+
+    Preconditions:
+        - discographies != []
+        - all(len(discography.songs) > 0 for discography in discographies)
+    """
+    songs = [song for discography in discographies for song in discography.songs.values()]
+    artists = [i for i in range(len(discographies)) for _ in discographies[i].songs]
+
+    if len({len(song.embedding) for song in songs}) > 1:
+        raise ValueError('The discographies were embedded with different models and cannot be blended')
+
+    embeddings = np.vstack([discography.embedding_matrix() for discography in discographies])
+    embeddings = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    # cosine similarity of every pair of songs, computed as a single matrix product
+    edges = embeddings @ embeddings.T > SIMILARITY_THRESHOLD
+    np.fill_diagonal(edges, False)
+    degrees = edges.sum(axis=1)
+
+    # stable sort, so that songs of equal degree keep the order of their discographies (the most viewed first)
+    ranking = [int(i) for i in np.argsort(-degrees, kind='stable')]
+
+    chosen = []
+    chosen_artists = set()
+    for i in ranking:
+        if artists[i] not in chosen_artists:
+            chosen.append(i)
+            chosen_artists.add(artists[i])
+
+    chosen.extend(i for i in ranking if i not in chosen)
+
+    return [songs[i] for i in chosen[:5]]
+
 
 if __name__ == "__main__":
     import python_ta
 
     python_ta.check_all(config={
-        'extra-imports': ['__future__', 'numpy'],
+        'extra-imports': ['__future__', 'numpy', 'zlib'],
         'allowed-io': [],
         'max-line-length': 120,
         'disable': ['too-many-nested-blocks']
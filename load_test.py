@@ -0,0 +1,203 @@
+"""Versify: The FUTURE of Songwriting (HTTP service load test)
+
+Created by: agent
+Date created: October 19, 2026
+
+General Information
+===============================
+
+Versify aims to utilize natural language processing and lyrical databases to generate completely new song lyrics in the
+style of a given musical artist. This will be entirely based on their most commonly used vocabulary and semantic
+patterns which are derived from existing songs.
+
+This file runs a load test of the Versify HTTP service (see versify_server.py). The service is started locally with
+fake backends in place of lyrics_ds.db and the cohere and openai APIs, which simply wait for a fixed latency, so no
+database or API keys are needed. Many concurrent clients then request songs from a handful of artists, and the
+latency, throughput, number of rejected (503) requests and number of refused connections are reported.
+
+Copyright and Usage Information
+===============================
+
+This file is Copyright (c) 2026 agent.
+"""
+import asyncio
+import json
+import random
+import time
+from argparse import ArgumentParser
+from discography import Discography
+from versify_server import VersifyServer
+
+
+class FakeBackends:
+    """Fake versions of the top level functions, which wait for a fixed latency instead of querying lyrics_ds.db
+    or calling the cohere and openai APIs.
+
+    Instance Attributes:
+        - latency: the number of seconds each fake API call takes
+        - discographies_built: the number of times fake_discography() has been called
+        - completions: the number of times fake_song() has been called
+    """
+    latency: float
+    discographies_built: int
+    completions: int
+
+    def __init__(self, latency: float) -> None:
+        self.latency = latency
+        self.discographies_built = 0
+        self.completions = 0
+
+    def fake_discography(self, artist_name: str) -> Discography:
+        """Returns a Discography of 20 songs with random embeddings, after waiting for five fake API calls.
+        """
+        self.discographies_built += 1
+        time.sleep(5 * self.latency)
+
+        discography = Discography(artist_name)
+        for i in range(20):
+            embedding = [random.random() for _ in range(16)]
+            discography.add_song(f'{artist_name} song {i}', i, f'lyrics of {artist_name} song {i}', embedding)
+        discography.match_all_similarities()
+        return discography
+
+    def fake_song(self, discography: Discography) -> str:
+        """Returns song lyrics made of the snippets of the top five songs of discography, after one fake API call.
+        """
+        self.completions += 1
+        time.sleep(self.latency)
+        return '\n'.join(song.snippet() for song in discography.top_five_songs())
+
+    def fake_title(self, lyrics: str) -> str:
+        """Returns a song title for the given lyrics, after one fake API call.
+        """
+        time.sleep(self.latency)
+        return lyrics.split('\n')[0].title()
+
+
+async def request(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, method: str, path: str,
+                  body: dict) -> tuple[int, dict[str, str], dict]:
+    """Sends a single request over an open keep-alive connection and returns the response status, headers (with
+    lowercase names) and JSON body.
+
+    Raises ConnectionError if the server closed the connection without sending a response.
+    """
+    data = json.dumps(body).encode('utf-8')
+    writer.write(f'{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n'
+                 f'Content-Length: {len(data)}\r\n\r\n'.encode('latin-1') + data)
+    await writer.drain()
+
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionResetError('The server closed the connection without a response')
+
+    status = int(status_line.split()[1])
+    headers = {}
+    line = await reader.readline()
+    while line not in (b'\r\n', b''):
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+        line = await reader.readline()
+
+    return status, headers, json.loads(await reader.readexactly(int(headers['content-length'])))
+
+
+async def run_client(port: int, artists: list[str], num_requests: int, latencies: list[float],
+                     statuses: dict[int, int], dropped: dict[str, int]) -> None:
+    """Requests num_requests songs from randomly chosen artists, retrying after any 503 response or dropped
+    connection.
+
+    Whenever the server closes the connection (such as when it already has too many connections open), the client
+    opens a new connection before retrying.
+
+    The latency of each successful request is appended to latencies, and statuses counts the status of every
+    response to a request. dropped counts the connections that the server refused with a 503 ('refused') and the
+    connections that it closed without any response ('closed').
+    """
+    connection = None
+
+    for _ in range(num_requests):
+        artist = random.choice(artists)
+        start = time.perf_counter()
+        status = None
+        first_attempt = True
+
+        while status is None or status == 503:
+            if not first_attempt:
+                await asyncio.sleep(random.uniform(0.05, 0.2))
+            first_attempt = False
+
+            try:
+                if connection is None:
+                    connection = await asyncio.open_connection('127.0.0.1', port)
+                status, headers, _ = await request(*connection, 'POST', '/song', {'artist': artist})
+            except ConnectionError:
+                status, headers = None, {'connection': 'close'}
+
+            if headers.get('connection', '').lower() == 'close':
+                # the server closed this connection, so a new one is opened for the next request
+                if connection is not None:
+                    connection[1].close()
+                connection = None
+
+                if status is None:
+                    dropped['closed'] += 1
+                else:
+                    dropped['refused'] += 1
+                    status = None
+            else:
+                statuses[status] = statuses.get(status, 0) + 1
+
+        latencies.append(time.perf_counter() - start)
+
+    if connection is not None:
+        connection[1].close()
+
+
+async def load_test(num_clients: int, num_requests: int, num_artists: int, latency: float,
+                    max_active: int, max_waiting: int) -> None:
+    """Starts a VersifyServer with fake backends on a free local port, runs num_clients concurrent clients
+    against it, and prints a summary of the results.
+    """
+    backends = FakeBackends(latency)
+    server = VersifyServer({}, max_active, max_waiting, backends.fake_discography, backends.fake_song,
+                           backends.fake_title, persist=False)
+    listener = await server.start('127.0.0.1', 0)
+    port = listener.sockets[0].getsockname()[1]
+
+    artists = [f'artist {i}' for i in range(num_artists)]
+    latencies = []
+    statuses = {}
+    dropped = {'refused': 0, 'closed': 0}
+
+    start = time.perf_counter()
+    await asyncio.gather(*(run_client(port, artists, num_requests, latencies, statuses, dropped)
+                           for _ in range(num_clients)))
+    elapsed = time.perf_counter() - start
+
+    listener.close()
+    await listener.wait_closed()
+    server.close()
+
+    latencies.sort()
+    print(f'{len(latencies)} songs generated by {num_clients} clients in {elapsed:.2f}s '
+          f'({len(latencies) / elapsed:.1f} songs/s)')
+    print(f'latency: p50 {latencies[len(latencies) // 2]:.3f}s, '
+          f'p95 {latencies[int(len(latencies) * 0.95)]:.3f}s, max {latencies[-1]:.3f}s')
+    print(f'responses by status: {dict(sorted(statuses.items()))}')
+    print(f'connections refused with 503: {dropped["refused"]}, closed without a response: {dropped["closed"]}')
+    print(f'discographies built: {backends.discographies_built} (for {num_artists} artists)')
+    print(f'song completions: {backends.completions} (for {len(latencies)} songs)')
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description='Load test the Versify HTTP service against fake backends')
+    parser.add_argument('--clients', type=int, default=200)
+    parser.add_argument('--requests', type=int, default=5, help='songs requested by each client')
+    parser.add_argument('--artists', type=int, default=10)
+    parser.add_argument('--latency', type=float, default=0.02, help='seconds taken by each fake API call')
+    parser.add_argument('--max-active', type=int, default=16)
+    parser.add_argument('--max-waiting', type=int, default=64)
+    args = parser.parse_args()
+
+    asyncio.run(load_test(args.clients, args.requests, args.artists, args.latency, args.max_active,
+                          args.max_waiting))
@@ -0,0 +1,32 @@
+"""Versify: The FUTURE of Songwriting (HTTP service main file)
+
+Created by: agent
+Date created: October 19, 2026
+
+
+General Information
+===============================
+Versify aims to utilize graphs in conjunction with natural language processing to generate completely new song lyrics in
+the style of a given musical artist. This will be entirely based on their commonly used vocabulary and semantic patterns
+which are derived from their existing songs.
+
+This file starts the Versify HTTP service (see versify_server.py) instead of the GUI.
+
+Copyright and Usage Information
+===============================
+
+This file is Copyright (c) 2026 agent.
+"""
+from argparse import ArgumentParser
+from versify_server import run_server
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description='Run the Versify HTTP service')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--max-active', type=int, default=8, help='number of generations that may run at once')
+    parser.add_argument('--max-waiting', type=int, default=32, help='number of requests that may wait to run')
+    args = parser.parse_args()
+
+    # starts the service, which runs until it is interrupted
+    run_server(args.host, args.port, args.max_active, args.max_waiting)
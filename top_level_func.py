@@ -18,12 +18,28 @@ Copyright and Usage Information
 This file is Copyright (c) 2023 Eugene Cho.
 """
 from sqlite3 import connect, Cursor, Connection
+from collections import deque
+from collections.abc import Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
 import sqlite3
 import pickle
 import cohere
 import openai
 import tiktoken
-from discography import Discography, Song
+from discography import Discography, Song, top_blended_songs
+
+# Maximum number of an artist's (most viewed) songs that are added to their Discography.
+# Since songs are embedded SONG_BATCH_SIZE at a time, this is no longer bound by cohere's limit on API calls per
+# minute. Instead, it bounds the pairwise similarity matching (which grows with the square of the number of songs)
+# and the size of each Discography saved in discographies.pkl.
+SONG_LIMIT = 100
+
+# Number of songs read from lyrics_ds.db (and embedded by a single cohere call) at a time
+SONG_BATCH_SIZE = 16
+
+# Number of batches of songs that may be embedded at the same time while the next batch is read
+EMBED_WORKERS = 4
 
 
 # ----------------- MAIN TOP LEVEL FUNCTIONS -----------------
@@ -44,8 +60,7 @@ def generate_discography(artist_name: str) -> Discography | str:
         - artist_name != ""
     """
     try:
-        cohere_apikey = get_api_keys()[0]
-        co = cohere.Client(cohere_apikey)
+        co = get_cohere_client()
 
     except cohere.CohereError:
         return "API_ERROR"
@@ -58,30 +73,45 @@ def generate_discography(artist_name: str) -> Discography | str:
         if not check_artist(artist_name, cur):
             return "ARTIST_ERROR"
 
-        songs = get_songs(artist_name, cur)
-
     except sqlite3.Error:
         return "DATABASE_ERROR"
     #  Connect to the lyrics_ds.db database and check if the given artist is in the database
 
     discography = Discography(artist_name)
+    pending = deque()
 
-    try:
-        for song in songs:
-            title = song[0]
-            lyrics = song[1]
-            if not (title is None or lyrics is None):  # Added to address an issue in the db where some entries are NULL
-                embedding = co.embed([lyrics]).embeddings[0]  # Call cohere API to get the embedding of the song lyric
-                discography.add_song(title, lyrics, embedding)
+    # The songs are streamed out of the database in batches. Each batch is embedded on a worker thread while the
+    # next batch is read, and is added to the graph as soon as its embeddings arrive. At most EMBED_WORKERS batches
+    # are in flight at once, so only a bounded number of lyrics are ever held in memory.
+    with ThreadPoolExecutor(max_workers=EMBED_WORKERS) as executor:
+        try:
+            for batch in get_songs(artist_name, cur):
+                # Added to address an issue in the db where some entries are NULL
+                songs = [song for song in batch if not (song[1] is None or song[2] is None)]
 
-        discography.match_all_similarities()
+                if songs:
+                    pending.append((songs, executor.submit(embed_lyrics, co, [song[2] for song in songs])))
 
-        conn.close()   # Close the connection to the database
-        return discography
+                if len(pending) >= EMBED_WORKERS:
+                    add_embedded_songs(discography, *pending.popleft())
 
-    except cohere.CohereError:
-        conn.close()
-        return "API_ERROR"
+            while pending:
+                add_embedded_songs(discography, *pending.popleft())
+
+            conn.close()   # Close the connection to the database
+            return discography
+
+        except sqlite3.Error:
+            for _, embeddings in pending:
+                embeddings.cancel()
+            conn.close()
+            return "DATABASE_ERROR"
+
+        except cohere.CohereError:
+            for _, embeddings in pending:
+                embeddings.cancel()
+            conn.close()
+            return "API_ERROR"
 
 
 def generate_song_title(lyrics: str) -> str:
@@ -118,23 +148,72 @@ def generate_song(discography: Discography) -> str:
 
     Uses openai.ChatCompletion.create() (using the GPT-3.5 model)
 
+    "DATABASE_ERROR" is returned if the lyrics of the prompt songs cannot be loaded from lyrics_ds.db.
+
     Preconditions:
         - len(discography.songs) > 0
     """
-    song_prompts = discography.top_five_songs()
+    return complete_song_prompts(discography.top_five_songs())
+
+
+def generate_blended_song(discographies: list[Discography]) -> str:
+    """Returns song lyrics blending the styles of the lyrics found in all of the given Discographies.
+
+    The songs used as prompts are the (at most) five most central songs of the graph combining all of the
+    discographies, as chosen by top_blended_songs(). Since this only uses the embeddings already stored in the
+    discographies, no songs are queried and no embeddings are generated; only the lyrics of the chosen songs
+    are loaded before the completion call.
+
+    Uses openai.ChatCompletion.create() (using the GPT-3.5 model)
+
+    "DATABASE_ERROR" is returned if the lyrics of the prompt songs cannot be loaded from lyrics_ds.db.
 
-    encoding = tiktoken.encoding_for_model("gpt-3.5-turbo")
-    system_description_content, prompt = generate_prompt(song_prompts)
-    num_tokens = len(encoding.encode(system_description_content + prompt))
-    # Calculates the number of openai tokens the prompt will cost
-    # The maximum tokens for an API call is 4096 (this includes the prompt and the response message),
-    # so to ensure that an error is not raised, we cap the tokens for the prompt to 3200, and 800 for the response
+    "EMBEDDING_ERROR" is returned if the discographies were generated with different embedding models
+    (so their embeddings have different lengths), since their songs then cannot be compared.
 
-    while num_tokens > 3400:
-        song_prompts.pop()
+    Preconditions:
+        - discographies != []
+        - all(len(discography.songs) > 0 for discography in discographies)
+    """
+    try:
+        song_prompts = top_blended_songs(discographies)
+    except ValueError:
+        return "EMBEDDING_ERROR"
+
+    return complete_song_prompts(song_prompts)
+
+# ----------------- MAIN TOP LEVEL FUNCTIONS -----------------
+
+
+# ----------------- HELPER FUNCTIONS -----------------
+def complete_song_prompts(song_prompts: list[Song]) -> str:
+    """Returns song lyrics generated by openai "in the style" of the lyrics of the given songs.
+
+    Songs are removed from the end of song_prompts until the prompt fits within the token limit.
+
+    "API_ERROR" is returned if there is an issue accessing the openai API.
+
+    "DATABASE_ERROR" is returned if the lyrics of the prompt songs cannot be loaded from lyrics_ds.db.
+
+    Preconditions:
+        - song_prompts != []
+    """
+    try:
+        encoding = tiktoken.encoding_for_model("gpt-3.5-turbo")
         system_description_content, prompt = generate_prompt(song_prompts)
         num_tokens = len(encoding.encode(system_description_content + prompt))
-    # Keep removing a song from the prompts until the number of tokens for the prompt is at most 3200.
+        # Calculates the number of openai tokens the prompt will cost
+        # The maximum tokens for an API call is 4096 (this includes the prompt and the response message),
+        # so to ensure that an error is not raised, we cap the tokens for the prompt to 3200, and 800 for the response
+
+        while num_tokens > 3400:
+            song_prompts.pop()
+            system_description_content, prompt = generate_prompt(song_prompts)
+            num_tokens = len(encoding.encode(system_description_content + prompt))
+        # Keep removing a song from the prompts until the number of tokens for the prompt is at most 3200.
+
+    except sqlite3.Error:
+        return "DATABASE_ERROR"
 
     try:
         openai.api_key = get_api_keys()[1]
@@ -153,16 +232,17 @@ def generate_song(discography: Discography) -> str:
     except openai.error.OpenAIError:
         return "API_ERROR"
 
-# ----------------- MAIN TOP LEVEL FUNCTIONS -----------------
-
 
-# ----------------- HELPER FUNCTIONS -----------------
 def generate_prompt(song_prompts: list[Song]) -> tuple[str, str]:
     """Generates the message prompts to pass to openai.ChatCompletion.create().
 
     system_description_content is the prompt that specifies to GPT what its objective/role is.
     prompt is the actual prompt that instructs GPT to generate lyrics based on the given lyrics.
 
+    The lyrics of each song are loaded from lyrics_ds.db with get_lyrics().
+
+    Raises sqlite3.Error if the lyrics of a song cannot be loaded.
+
     Preconditions:
         - song_prompts != []
     """
@@ -170,7 +250,9 @@ def generate_prompt(song_prompts: list[Song]) -> tuple[str, str]:
 
     for song in song_prompts:
         song_lyrics += f'----------{song.title}----------\n'
-        song_lyrics += song.lyrics
+        rowid, lyrics = get_lyrics(song.rowid, song.title, song.artist_name)
+        song.rowid = rowid  # in case the song was found again under a new rowid
+        song_lyrics += lyrics
 
     system_description_content = 'You generate lyrics of a song in the style of example songs that you are given.'
     prompt = f"Write a unique and original song lyrics in a similar style to that of the following songs: " \
@@ -197,6 +279,19 @@ def get_api_keys() -> tuple[str, str]:
     return cohere_apikey, openai_apikey
 
 
+@lru_cache(maxsize=1)
+def get_cohere_client() -> cohere.Client:
+    """Returns a cohere client connected with the cohere API key from keys.txt.
+
+    The client is created (and its API key checked) only once, and is then shared by every later call,
+    including calls made from different threads.
+
+    Preconditions:
+        - The first line of keys.txt is a valid API key for cohere
+    """
+    return cohere.Client(get_api_keys()[0])
+
+
 def connect_to_database() -> Connection:
     """Opens and returns the connection to the lyrics_ds.db database.
 
@@ -226,11 +321,13 @@ def check_artist(artist_name: str, cur: Cursor) -> bool:
     return cur.fetchone() is not None
 
 
-def get_songs(artist_name: str, cur: Cursor) -> list[tuple[str, str]]:
-    """Queries and returns the songs made by the given artist from the songs table of lyrics_ds.db
+def get_songs(artist_name: str, cur: Cursor) -> Iterator[list[tuple[int, str, str]]]:
+    """Queries and yields the songs made by the given artist from the songs table of lyrics_ds.db
 
-    Returns a list of tuples where each tuple represents a song. Each tuple contains two strings,
-    the first string is the title of the song, and the latter is the song's lyrics.
+    At most SONG_LIMIT songs are queried, starting from the most viewed. The songs are fetched and yielded in
+    lists of at most SONG_BATCH_SIZE songs, so that the whole result set never has to be held in memory.
+    Each tuple represents a song and contains the rowid of the song in the songs table, followed by two
+    strings: the title of the song, and the song's lyrics.
 
     Note that the query ignores capitlization of artist_name. So passing in artist_name
     as 'DRAKE' vs 'drake' would result in the same query.
@@ -242,25 +339,110 @@ def get_songs(artist_name: str, cur: Cursor) -> list[tuple[str, str]]:
         - artist_name != ""
         - There exists at least one song by artist_name in the 'songs' table
     """
-    cur.execute('SELECT title, lyrics '
+    cur.execute('SELECT rowid, title, lyrics '
                 'FROM songs '
                 'WHERE artist = ? '
                 'COLLATE NOCASE '
                 'ORDER BY views DESC '
-                'LIMIT 100',
-                (artist_name.lower(),))
-    # We cap the query results at at most 100 songs because the free version of
-    # cohere (when we call co.embed()) only allows 100 API calls per minute
+                'LIMIT ?',
+                (artist_name.lower(), SONG_LIMIT))
+
+    batch = cur.fetchmany(SONG_BATCH_SIZE)
+    while batch:
+        yield batch
+        batch = cur.fetchmany(SONG_BATCH_SIZE)
+
+
+def embed_lyrics(co: cohere.Client, lyrics: list[str]) -> list[list[float]]:
+    """Returns the cohere embeddings of each of the given song lyrics, in the same order, using a single API call.
+
+    Preconditions:
+        - lyrics != []
+        - all(song_lyrics != '' for song_lyrics in lyrics)
+    """
+    return co.embed(lyrics).embeddings
+
+
+def add_embedded_songs(discography: Discography, songs: list[tuple[int, str, str]],
+                       embeddings: Future) -> None:
+    """Waits for the embeddings of the given songs, then adds each song to discography along with
+    edges to the songs already in discography that it is similar to.
+
+    A song whose title is already in discography is skipped. Since songs are queried by descending views,
+    this keeps the most viewed song of each title.
+
+    Raises cohere.CohereError if the embeddings could not be generated.
 
-    return cur.fetchall()
+    Preconditions:
+        - embeddings is the result of embed_lyrics() called on the lyrics of songs
+    """
+    for song, embedding in zip(songs, embeddings.result()):
+        rowid, title, lyrics = song
+        if title not in discography.songs:
+            discography.add_song(title, rowid, lyrics, embedding)
+            discography.match_song_similarities(discography.songs[title])
+
+
+@lru_cache(maxsize=32)
+def get_lyrics(rowid: int, title: str, artist_name: str) -> tuple[int, str]:
+    """Queries and returns the rowid and lyrics of the given song from the songs table of lyrics_ds.db
+
+    The song is first looked up by its rowid, checking that the title matches. The 'songs' table has no
+    INTEGER PRIMARY KEY, so its rowids can be renumbered if lyrics_ds.db is ever vacuumed or rebuilt. If that
+    happened since the song was saved in discographies.pkl, the song is instead found again by its title and
+    artist (the most viewed match, just like get_songs()), and its new rowid is returned along with its lyrics.
+
+    The most recently loaded lyrics are kept in a small LRU cache, since generate_song() rebuilds
+    its prompt from the same few songs several times while fitting the prompt to the token limit.
+
+    Raises sqlite3.Error if the song can be found neither by its rowid nor by its title and artist.
+
+    Preconditions:
+        - lyrics_ds.db contains a table called 'songs'
+        - The 'songs' table contains a 'title', 'artist', 'views' and 'lyrics' column
+    """
+    conn = connect_to_database()
+    try:
+        cur = conn.cursor()
+        cur.execute('SELECT rowid, lyrics FROM songs WHERE rowid = ? AND title = ?', (rowid, title))
+        row = cur.fetchone()
+
+        if row is None or row[1] is None:
+            cur.execute('SELECT rowid, lyrics '
+                        'FROM songs '
+                        'WHERE title = ? AND artist = ? COLLATE NOCASE AND lyrics IS NOT NULL '
+                        'ORDER BY views DESC '
+                        'LIMIT 1',
+                        (title, artist_name.lower()))
+            row = cur.fetchone()
+    finally:
+        conn.close()
+
+    if row is None:
+        raise sqlite3.Error(f'The lyrics of {title} by {artist_name} are no longer in lyrics_ds.db')
+
+    return row[0], row[1]
 
 
 def load_discographies() -> dict[str, Discography]:
     """Loads and returns a dictionary of already previously Discography objects from discographies.pkl
+
+    Discographies saved before Songs stored their rowid (and instead held their full lyrics) are
+    left out, so that they are generated again the next time their artist is requested. Songs saved
+    before they stored their artist_name are given the artist_name of their Discography.
     """
     try:
         with open('discographies.pkl', 'rb') as file:
             discographies = pickle.load(file)
+
+        discographies = {name: discographies[name] for name in discographies
+                         if all(hasattr(song, 'rowid') for song in discographies[name].songs.values())}
+
+        for discography in discographies.values():
+            for song in discography.songs.values():
+                if not hasattr(song, 'artist_name'):
+                    song.artist_name = discography.artist_name
+
         return discographies
 
     except EOFError:
@@ -283,7 +465,8 @@ if __name__ == "__main__":
     import python_ta
 
     python_ta.check_all(config={
-        'extra-imports': ['cohere', 'discography', 'sqlite3', 'openai', 'tiktoken', 'pickle'],
+        'extra-imports': ['cohere', 'discography', 'sqlite3', 'openai', 'tiktoken', 'pickle', 'functools',
+                          'collections', 'collections.abc', 'concurrent.futures'],
         'allowed-io': ['connect_to_database', 'get_api_keys', 'load_discographies', 'save_discographies'],
         'max-line-length': 120
     })
@@ -0,0 +1,477 @@
+"""Versify: The FUTURE of Songwriting (HTTP service)
+
+Created by: agent
+Date created: October 19, 2026
+
+General Information
+===============================
+
+Versify aims to utilize natural language processing and lyrical databases to generate completely new song lyrics in the
+style of a given musical artist. This will be entirely based on their most commonly used vocabulary and semantic
+patterns which are derived from existing songs.
+
+This file contains a local asynchronous HTTP/JSON service for Versify. A single server process holds one shared
+in-memory cache of Discography objects and one pool of API connections, which are then shared by every client.
+
+The service accepts the following requests (all request and response bodies are JSON objects):
+    - GET /health: returns the number of running and waiting requests, open connections and cached discographies
+    - POST /discography {"artist": ...}: generates (or retrieves) the artist's Discography and returns its song titles
+    - POST /song {"artist": ...}: returns the title and lyrics of a new song in the style of the artist
+    - POST /title {"lyrics": ...}: returns a song title for the given lyrics
+    - POST /blend {"artists": [...]}: returns the title and lyrics of a new song blending the styles of the artists
+
+Copyright and Usage Information
+===============================
+
+This file is Copyright (c) 2026 agent.
+"""
+import asyncio
+import json
+from asyncio import StreamReader, StreamWriter
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+import openai
+import requests
+from top_level_func import generate_discography, generate_song, generate_song_title, generate_blended_song, \
+    load_discographies, save_discographies
+from discography import Discography
+
+# Maximum size in bytes of a request body that the server accepts
+MAX_BODY_SIZE = 64 * 1024
+
+# Maximum number of artists that can be blended by a single request
+MAX_BLEND_ARTISTS = 5
+
+# Maximum number of client connections that may be open at the same time
+MAX_CONNECTIONS = 256
+
+# Number of seconds a client may take to send a request (or to read a response, or to stay idle between two
+# requests) before its connection is closed
+CLIENT_TIMEOUT = 30
+
+# HTTP status codes returned for each of the error strings of the top level functions
+ERROR_STATUSES = {'ARTIST_ERROR': 404, 'DATABASE_ERROR': 500, 'API_ERROR': 502, 'EMBEDDING_ERROR': 400}
+
+# Descriptions sent to the client along with error strings that do not explain themselves
+ERROR_MESSAGES = {'EMBEDDING_ERROR': 'EMBEDDING_ERROR: these artists were generated with different embedding models, '
+                                    'so they cannot be blended'}
+
+# Number of times a failed connection to the openai API is retried (the same as openai's own default session)
+OPENAI_CONNECTION_RETRIES = 2
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 413: 'Payload Too Large',
+           500: 'Internal Server Error', 502: 'Bad Gateway', 503: 'Service Unavailable'}
+
+
+class HTTPError(Exception):
+    """Exception raised while handling a request, which is sent back to the client as an error response.
+
+    Instance Attributes:
+        - status: the HTTP status code of the error response
+        - message: description of the error sent to the client
+    """
+    status: int
+    message: str
+
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class VersifyServer:
+    """Class containing the functionality of the Versify HTTP service.
+
+    The top level functions are blocking, so they are run on a pool of max_active worker threads. Every request
+    (other than GET /health) takes one slot when it is admitted and keeps it until its response is sent, so at most
+    max_active requests run while at most max_waiting others wait for a worker. Once all slots are taken, new
+    requests are rejected right away with a 503 response (instead of queueing without bound). A request that is
+    admitted is never rejected part way through, so the API calls it has already paid for are not wasted.
+
+    Concurrent requests for an artist whose Discography is not cached yet share a single generate_discography() call.
+    The requests waiting for that call hold their own slots, so they also count towards max_waiting.
+
+    At most MAX_CONNECTIONS client connections are kept open at once, and a connection is closed once its client
+    has not sent a request or read a response for CLIENT_TIMEOUT seconds.
+
+    Instance Attributes:
+        - discographies: a mapping of artist name to their corresponding Discography, shared by all clients
+        - max_active: the maximum number of top level function calls that run at the same time
+        - max_waiting: the maximum number of requests that may wait for one of the max_active workers
+        - active: the number of admitted requests that are currently running or waiting to run
+        - connections: the number of client connections that are currently open
+        - build_discography: function used to generate a Discography that is not cached yet
+        - build_song: function used to generate song lyrics from a Discography
+        - build_title: function used to generate a song title from song lyrics
+        - build_blended_song: function used to generate song lyrics from several Discographies
+        - persist: whether newly generated Discographies are saved to discographies.pkl
+
+    Representation Invariants:
+        - self.max_active > 0
+        - self.max_waiting >= 0
+        - 0 <= self.active <= self.max_active + self.max_waiting
+        - 0 <= self.connections <= MAX_CONNECTIONS
+    """
+    discographies: dict[str, Discography]
+    max_active: int
+    max_waiting: int
+    active: int
+    connections: int
+    build_discography: Callable[[str], Discography | str]
+    build_song: Callable[[Discography], str]
+    build_title: Callable[[str], str]
+    build_blended_song: Callable[[list[Discography]], str]
+    persist: bool
+    _executor: ThreadPoolExecutor
+    _workers: asyncio.Semaphore
+    _building: dict[str, asyncio.Future]
+    _save_lock: asyncio.Lock
+
+    def __init__(self, discographies: dict[str, Discography], max_active: int = 8, max_waiting: int = 32,
+                 build_discography: Callable[[str], Discography | str] = generate_discography,
+                 build_song: Callable[[Discography], str] = generate_song,
+                 build_title: Callable[[str], str] = generate_song_title,
+                 build_blended_song: Callable[[list[Discography]], str] = generate_blended_song,
+                 persist: bool = True) -> None:
+        """Initialize the server with the given discography cache and limits.
+
+        Preconditions:
+            - max_active > 0
+            - max_waiting >= 0
+        """
+        self.discographies = discographies
+        self.max_active = max_active
+        self.max_waiting = max_waiting
+        self.active = 0
+        self.connections = 0
+        self.build_discography = build_discography
+        self.build_song = build_song
+        self.build_title = build_title
+        self.build_blended_song = build_blended_song
+        self.persist = persist
+        self._executor = ThreadPoolExecutor(max_workers=max_active)
+        self._workers = asyncio.Semaphore(max_active)
+        self._building = {}
+        self._save_lock = asyncio.Lock()
+
+    async def start(self, host: str, port: int) -> asyncio.AbstractServer:
+        """Starts listening for clients on the given host and port, and returns the running asyncio server.
+        """
+        return await asyncio.start_server(self.handle_client, host, port)
+
+    def close(self) -> None:
+        """Shuts down the worker threads of this server.
+        """
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    async def handle_client(self, reader: StreamReader, writer: StreamWriter) -> None:
+        """Reads and answers requests from a single client connection until the client closes it, or until the
+        client stays silent for CLIENT_TIMEOUT seconds.
+
+        The connection is refused with a 503 response if MAX_CONNECTIONS connections are already open.
+        """
+        if self.connections >= MAX_CONNECTIONS:
+            try:
+                await asyncio.wait_for(write_response(writer, 503, {'error': 'Versify has too many connections, '
+                                                                             'please try again later'}, False),
+                                       CLIENT_TIMEOUT)
+            except (ConnectionError, asyncio.TimeoutError):
+                pass
+            writer.close()
+            return
+
+        self.connections += 1
+        try:
+            keep_alive = True
+            while keep_alive:
+                request = await asyncio.wait_for(read_request(reader), CLIENT_TIMEOUT)
+                if request is None:
+                    break
+
+                method, path, headers, body = request
+                keep_alive = headers.get('connection', '').lower() != 'close'
+
+                admitted = False
+                try:
+                    admitted = self.admit(path)
+                    status, response = 200, await self.route(method, path, body)
+                except HTTPError as error:
+                    status, response = error.status, {'error': error.message}
+                except Exception:
+                    status, response = 500, {'error': 'Versify encountered an unexpected error'}
+
+                try:
+                    await asyncio.wait_for(write_response(writer, status, response, keep_alive), CLIENT_TIMEOUT)
+                finally:
+                    if admitted:
+                        self.active -= 1
+
+        except HTTPError as error:
+            # the request could not be parsed, so the connection cannot be reused
+            try:
+                await asyncio.wait_for(write_response(writer, error.status, {'error': error.message}, False),
+                                       CLIENT_TIMEOUT)
+            except (ConnectionError, asyncio.TimeoutError):
+                pass
+
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError, ValueError):
+            # the client disconnected, stayed silent for too long, or sent a line longer than the stream buffer
+            pass
+
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    def admit(self, path: str) -> bool:
+        """Takes a slot for a request to the given path, and returns whether a slot was taken.
+
+        GET /health is always answered right away without taking a slot. The caller must give back the slot
+        (by decreasing self.active) once the response has been sent.
+
+        Raises HTTPError (503) if all max_active + max_waiting slots are already taken.
+        """
+        if path == '/health':
+            return False
+
+        if self.active >= self.max_active + self.max_waiting:
+            raise HTTPError(503, 'Versify is busy, please try again later')
+
+        self.active += 1
+        return True
+
+    async def route(self, method: str, path: str, body: bytes) -> dict[str, Any]:
+        """Returns the JSON response to the request with the given method, path and body.
+
+        Each call to a top level function waits for a worker, and the song and title of a single request are
+        generated on the same worker one after the other.
+
+        Raises HTTPError if the request cannot be answered.
+        """
+        if path == '/health':
+            if method != 'GET':
+                raise HTTPError(405, 'Use GET for this path')
+            return {'status': 'ok', 'active': self.active, 'connections': self.connections,
+                    'cached': len(self.discographies)}
+
+        if path not in ('/discography', '/song', '/title', '/blend'):
+            raise HTTPError(404, f'Unknown path {path}')
+
+        if method != 'POST':
+            raise HTTPError(405, 'Use POST for this path')
+
+        if path == '/title':
+            lyrics = get_field(body, 'lyrics')
+            async with self._workers:
+                return {'title': check_output(await self.run_blocking(self.build_title, lyrics))}
+
+        if path == '/blend':
+            artists = get_artists(body)
+            discographies = await asyncio.gather(*(self.get_discography(artist) for artist in artists))
+            async with self._workers:
+                lyrics = check_output(await self.run_blocking(self.build_blended_song, discographies))
+                title = check_output(await self.run_blocking(self.build_title, lyrics))
+            return {'artists': [discography.artist_name for discography in discographies],
+                    'title': title, 'lyrics': lyrics}
+
+        discography = await self.get_discography(get_field(body, 'artist'))
+
+        if path == '/discography':
+            return {'artist': discography.artist_name, 'songs': list(discography.songs)}
+
+        async with self._workers:
+            lyrics = check_output(await self.run_blocking(self.build_song, discography))
+            title = check_output(await self.run_blocking(self.build_title, lyrics))
+        return {'artist': discography.artist_name, 'title': title, 'lyrics': lyrics}
+
+    async def get_discography(self, artist_name: str) -> Discography:
+        """Returns the Discography of the given artist from self.discographies, generating and caching it first if
+        it is not cached yet.
+
+        Raises HTTPError if the Discography cannot be generated.
+        """
+        artist_name = artist_name.strip().lower()
+
+        if artist_name in self.discographies:
+            return self.discographies[artist_name]
+
+        if artist_name in self._building:
+            # another request is already generating this Discography, so wait for its result instead
+            return check_output(await asyncio.shield(self._building[artist_name]))
+
+        building = asyncio.get_running_loop().create_future()
+        # mark any exception as retrieved, since there may be no other request waiting for it
+        building.add_done_callback(lambda future: future.cancelled() or future.exception())
+        self._building[artist_name] = building
+
+        try:
+            async with self._workers:
+                discography = await self.run_blocking(self.build_discography, artist_name)
+            building.set_result(discography)
+        except asyncio.CancelledError:
+            building.cancel()
+            raise
+        except Exception as error:
+            building.set_exception(error)
+            raise
+        finally:
+            self._building.pop(artist_name)
+
+        discography = check_output(discography)
+        self.discographies[artist_name] = discography
+
+        if self.persist:
+            async with self._save_lock:
+                # a copy is saved, since other requests may add to self.discographies while it is being written
+                await asyncio.get_running_loop().run_in_executor(None, save_discographies, dict(self.discographies))
+
+        return discography
+
+    async def run_blocking(self, function: Callable, *args: Any) -> Any:
+        """Runs function(*args) on one of the worker threads and returns its output.
+
+        Preconditions:
+            - the caller holds one of the self._workers slots
+        """
+        return await asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
+
+
+async def read_request(reader: StreamReader) -> tuple[str, str, dict[str, str], bytes] | None:
+    """Reads a single HTTP request from reader and returns its method, path, headers and body.
+
+    Header names are returned in lowercase. Returns None if the client closed the connection before sending
+    a new request.
+
+    Raises HTTPError if the request is malformed or its body is larger than MAX_BODY_SIZE.
+    """
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+
+    parts = request_line.decode('latin-1').split()
+    if len(parts) != 3:
+        raise HTTPError(400, 'Malformed request line')
+    method, path = parts[0], parts[1]
+
+    headers = {}
+    line = await reader.readline()
+    while line not in (b'\r\n', b'\n', b''):
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+        line = await reader.readline()
+
+    try:
+        length = int(headers.get('content-length', '0'))
+    except ValueError:
+        raise HTTPError(400, 'Malformed Content-Length header') from None
+
+    if length > MAX_BODY_SIZE:
+        raise HTTPError(413, 'Request body is too large')
+
+    body = await reader.readexactly(length) if length > 0 else b''
+    return method, path, headers, body
+
+
+async def write_response(writer: StreamWriter, status: int, response: dict[str, Any], keep_alive: bool) -> None:
+    """Writes an HTTP response with the given status and JSON body to writer, and waits until it can be sent.
+    """
+    body = json.dumps(response).encode('utf-8')
+    head = f'HTTP/1.1 {status} {REASONS[status]}\r\n' \
+           f'Content-Type: application/json\r\n' \
+           f'Content-Length: {len(body)}\r\n' \
+           f'Connection: {"keep-alive" if keep_alive else "close"}\r\n'
+    if status == 503:
+        head += 'Retry-After: 1\r\n'
+
+    writer.write(head.encode('latin-1') + b'\r\n' + body)
+    await writer.drain()
+
+
+def get_field(body: bytes, field: str) -> str:
+    """Returns the given field of the JSON object in body.
+
+    Raises HTTPError if body is not a JSON object whose field is a non-empty string.
+    """
+    try:
+        request = json.loads(body)
+    except ValueError:
+        raise HTTPError(400, 'Request body must be JSON') from None
+
+    if not isinstance(request, dict) or not isinstance(request.get(field), str) or request[field].strip() == '':
+        raise HTTPError(400, f'Request body must contain a non-empty "{field}" string')
+
+    return request[field]
+
+
+def get_artists(body: bytes) -> list[str]:
+    """Returns the distinct artist names in the "artists" list of the JSON object in body.
+
+    Raises HTTPError if body is not a JSON object whose "artists" field is a list of 1 to MAX_BLEND_ARTISTS
+    distinct, non-empty strings.
+    """
+    try:
+        request = json.loads(body)
+    except ValueError:
+        raise HTTPError(400, 'Request body must be JSON') from None
+
+    if not isinstance(request, dict) or not isinstance(request.get('artists'), list) or \
+            not all(isinstance(artist, str) and artist.strip() != '' for artist in request['artists']):
+        raise HTTPError(400, 'Request body must contain an "artists" list of non-empty strings')
+
+    artists = list(dict.fromkeys(artist.strip().lower() for artist in request['artists']))
+    if not 0 < len(artists) <= MAX_BLEND_ARTISTS:
+        raise HTTPError(400, f'Between 1 and {MAX_BLEND_ARTISTS} artists can be blended')
+
+    return artists
+
+
+def check_output(function_output: Any) -> Any:
+    """Returns function_output, or raises the matching HTTPError if it is one of the error strings returned by the
+    top level functions.
+    """
+    if isinstance(function_output, str) and function_output in ERROR_STATUSES:
+        raise HTTPError(ERROR_STATUSES[function_output], ERROR_MESSAGES.get(function_output, function_output))
+    return function_output
+
+
+def pool_openai_connections(max_connections: int) -> None:
+    """Makes every openai API call share a single pool of up to max_connections HTTP connections.
+
+    Failed connections are still retried OPENAI_CONNECTION_RETRIES times, like they are by openai's default session.
+    """
+    session = requests.Session()
+    session.mount('https://', requests.adapters.HTTPAdapter(pool_maxsize=max_connections,
+                                                            max_retries=OPENAI_CONNECTION_RETRIES))
+    openai.requestssession = session
+
+
+def run_server(host: str = '127.0.0.1', port: int = 8000, max_active: int = 8, max_waiting: int = 32) -> None:
+    """Runs the Versify HTTP service on the given host and port until it is interrupted.
+
+    Preconditions:
+        - max_active > 0
+        - max_waiting >= 0
+    """
+    pool_openai_connections(max_active)
+
+    async def serve() -> None:
+        server = VersifyServer(load_discographies(), max_active, max_waiting)
+        try:
+            async with await server.start(host, port) as listener:
+                await listener.serve_forever()
+        finally:
+            server.close()
+
+    asyncio.run(serve())
+
+
+if __name__ == "__main__":
+    import python_ta
+
+    python_ta.check_all(config={
+        'extra-imports': ['asyncio', 'json', 'collections.abc', 'concurrent.futures', 'typing', 'openai',
+                          'requests', 'top_level_func', 'discography'],
+        'allowed-io': [],
+        'max-line-length': 120,
+        'disable': ['too-many-instance-attributes', 'too-many-arguments', 'broad-exception-caught']
+    })